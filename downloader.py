@@ -1,14 +1,20 @@
 import yt_dlp
+import redis
 import os
-import subprocess
-import json
-import re
 import time
 import logging
 import base64
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import queue
+import shutil
 from pathlib import Path
+from types import MappingProxyType
 import tempfile
-import glob
+import threading
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,6 +22,100 @@ logger = logging.getLogger(__name__)
 
 # Use environment variables or defaults
 MAX_DURATION = int(os.getenv("MAX_DURATION_SECONDS", 1800)) # 30 minutes
+# Read granularity for both yt-dlp's HTTP downloader and the file streamer
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+# Characters allowed in the Content-Disposition filename; after folding the
+# title to ASCII, every other character is mapped to "_" by str.translate.
+_SAFE_FILENAME_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-. ")
+_FILENAME_TABLE = str.maketrans({chr(c): '_' for c in range(128) if chr(c) not in _SAFE_FILENAME_CHARS})
+# Playlist entries only carry the video ID
+_YOUTUBE_WATCH_URL = "https://www.youtube.com/watch?v="
+# Video codec preference by codec family (the part of vcodec before the first
+# dot, e.g. "avc1" for "avc1.64001F"): newer codecs score higher.
+_VCODEC_SCORES = {
+    'av01': 300, 'av1': 300,
+    'vp09': 200, 'vp9': 200,
+    'avc1': 150, 'avc3': 150, 'avc': 150, 'h264': 150,
+}
+# MP3 bitrates (kbit/s) selectable through the mode string, e.g. "audio_320";
+# checked in order, plain "audio" gets the default.
+_MP3_BITRATES = ("320", "128", "64")
+_DEFAULT_MP3_BITRATE = "192"
+# Output container -> response Content-Type
+_CONTENT_TYPES = {
+    'm4a': "audio/mp4",
+    'mp3': "audio/mpeg",
+    'webm': "video/webm",
+    'mp4': "video/mp4",
+}
+
+# Optional RAM-backed tmpfs (e.g. /dev/shm) for downloads whose size is known
+# and fits comfortably. Off by default: tmpfs pages count against the
+# container's memory limit for as long as the file is being sent, and
+# Docker's default /dev/shm is only 64 MB.
+SHM_DIR = os.getenv("DOWNLOAD_SHM_DIR", "")
+# Free tmpfs space required per expected byte: while merging, the separate
+# video and audio files and the merged output all exist at once.
+SHM_HEADROOM = 3
+# Space promised to downloads already placed in SHM_DIR, so concurrent
+# downloads can't each pass the free-space check and then fill it together.
+_shm_reserved = {}  # {tmpdir: bytes}
+# Reentrant: DownloadFile.close() takes it, and the garbage collector may run
+# that (via __del__) in a thread that is already inside a locked section.
+_shm_lock = threading.RLock()
+
+# Raw yt-dlp info dicts are cached per URL for a short while so that an
+# /api/info call followed by /api/download doesn't run the extractor twice.
+CACHE_TTL = int(os.getenv("YDL_CACHE_TTL", 300))  # seconds, 0 disables
+# Full YouTube info dicts (formats, automatic_captions) take ~2 MB each in memory
+CACHE_MAX_ENTRIES = int(os.getenv("YDL_CACHE_SIZE", 32))
+_info_cache = {}  # {(url, opts): (expires_at, info)}
+_info_cache_lock = threading.Lock()
+
+# /api/info summaries are also shared between workers through Redis (the same
+# REDIS_URL the rate limiter uses). Playlists change more often than videos.
+# Full video info dicts go there too, for YDL_CACHE_TTL like the local cache,
+# and so do fetched subtitle files, which practically never change.
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", 1))  # seconds, connect and per command
+INFO_CACHE_TTL = int(os.getenv("INFO_CACHE_TTL", 600))  # seconds
+PLAYLIST_CACHE_TTL = int(os.getenv("PLAYLIST_CACHE_TTL", 60))  # seconds
+SUBTITLE_CACHE_TTL = int(os.getenv("SUBTITLE_CACHE_TTL", 86400))  # seconds
+_redis_client = None
+
+# Idle YoutubeDL instances for metadata extraction, keyed by their options.
+# Constructing one re-parses the options and sets up cookies and network
+# handlers, and the extractor instances it keeps hold the player JS caches.
+_ydl_pool = {}  # {opts_key: (cookie file mtime, queue.SimpleQueue of idle instances)}
+_ydl_pool_lock = threading.Lock()
+
+# Downloads currently being prepared or sent by this worker, keyed by request.
+# A second request for the same (url, quality, mode) waits for the running
+# download and sends the same file; the temp directory goes away once the
+# last response using it is closed.
+_inflight = {}  # {(url, quality, mode): _SharedDownload}
+_inflight_lock = threading.RLock()  # reentrant for the same reason as _shm_lock
+# How long (seconds) a request waits for an identical download before running
+# its own instead
+INFLIGHT_WAIT_TIMEOUT = int(os.getenv("INFLIGHT_WAIT_TIMEOUT", 300))
+
+def _lazy_extractors_active():
+    """Whether yt-dlp resolves extractor classes lazily (release wheels do)."""
+    # Importing the registry here also moves its one-off cost out of the first request.
+    from yt_dlp.extractor import extractors
+    try:
+        from yt_dlp.globals import LAZY_EXTRACTORS
+        return bool(LAZY_EXTRACTORS.value)
+    except ImportError:
+        # Older yt-dlp releases
+        return bool(getattr(extractors, '_LAZY_LOADER', False))
+
+
+if not _lazy_extractors_active():
+    logger.warning(
+        "yt-dlp lazy extractors are not active, so every extraction imports all "
+        "extractor modules. Unset YTDLP_NO_LAZY_EXTRACTORS or install a release wheel."
+    )
 
 # Cached path for cookies written from YT_COOKIES_BASE64 (one temp file per process)
 _cookies_temp_path = None
@@ -43,33 +143,54 @@ def _get_cookies_path():
     return None
 
 
+# Headers sent with every yt-dlp request, to appear more like a regular browser
+_HTTP_HEADERS = MappingProxyType({
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-us,en;q=0.5',
+    'Sec-Fetch-Mode': 'navigate',
+})
+
+# The part of the yt-dlp options that is the same for every request; cookies
+# are resolved per call in get_ydl_base_opts().
+_BASE_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'noplaylist': True,
+    # User-Agent spoofing - use iPhone-style UA (can help with some geo / age gates)
+    'user_agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1',
+    # Retry and timeout settings
+    'retries': 10,
+    'fragment_retries': 10,
+    'skip_unavailable_fragments': True,
+    # Fetch DASH/HLS fragments in parallel rather than one at a time.
+    # (YouTube's progressive formats are already fetched in 10 MB ranges
+    # by the extractor, which is what avoids its single-stream throttle.)
+    'concurrent_fragment_downloads': int(os.getenv("YDL_CONCURRENT_FRAGMENTS", 4)),
+    'socket_timeout': 30,
+    # Start with large reads instead of yt-dlp's 1 KB default block size
+    # (it still adapts the block size to the measured rate).
+    'buffersize': CHUNK_SIZE,
+    # IMPORTANT: do NOT override youtube player_client here.
+    # Let yt-dlp use its default client selection so that all
+    # available formats (including 720p/1080p/4K) are exposed.
+}
+# yt-dlp caches downloaded player JS and signature functions on disk.
+# Point it at a persistent volume so restarted workers start warm.
+if os.getenv("YT_DLP_CACHE_DIR"):
+    _BASE_OPTS['cachedir'] = os.getenv("YT_DLP_CACHE_DIR")
+_BASE_OPTS = MappingProxyType(_BASE_OPTS)
+
+
 # Enhanced yt-dlp options to bypass bot detection
 def get_ydl_base_opts():
     """
     Returns base yt-dlp options with anti-bot measures.
     This includes cookie extraction from browser and user-agent spoofing.
     """
-    opts = {
-        'quiet': True,
-        'no_warnings': True,
-        'noplaylist': True,
-        # User-Agent spoofing - use iPhone-style UA (can help with some geo / age gates)
-        'user_agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1',
-        # Additional headers to appear more like a regular browser
-        'http_headers': {
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-us,en;q=0.5',
-            'Sec-Fetch-Mode': 'navigate',
-        },
-        # Retry and timeout settings
-        'retries': 10,
-        'fragment_retries': 10,
-        'skip_unavailable_fragments': True,
-        'socket_timeout': 30,
-        # IMPORTANT: do NOT override youtube player_client here.
-        # Let yt-dlp use its default client selection so that all
-        # available formats (including 720p/1080p/4K) are exposed.
-    }
+    # Callers update the copy in place; the headers dict is copied as well
+    # so nothing (yt-dlp included) can modify the shared one.
+    opts = dict(_BASE_OPTS)
+    opts['http_headers'] = dict(_HTTP_HEADERS)
 
     # --- Cookie handling for bot / sign-in checks (required for YouTube in production) ---
     cookie_file = _get_cookies_path()
@@ -98,82 +219,68 @@ def _choose_video_and_audio_formats(info, target_height: int, prefer_webm: bool
 
     Strategy:
       1. Try exact height match (height == target_height).
-      2. Then closest higher resolution (min height > target_height).
-      3. Finally closest lower resolution (max height < target_height).
+      2. Then closest lower resolution (max height < target_height).
+      3. Finally closest higher resolution (min height > target_height).
 
     We optionally prefer WebM streams when requested, but fall back to any
     container if necessary so we never drop unnecessarily to a low resolution.
-    """
-    formats = info.get('formats', [])
-    video_formats = [f for f in formats if f.get('vcodec') != 'none' and f.get('height')]
-    audio_formats = [f for f in formats if f.get('acodec') != 'none' and f.get('vcodec') == 'none']
-
-    if not video_formats:
-        logger.warning("No video formats found for this video.")
-        return None, None
 
+    All of this happens in a single pass over ``info['formats']``: each video
+    candidate gets a rank tuple (exact > closest below > closest above, then
+    codec/bitrate score) and only the best candidate so far is kept.
+    """
     target_height = int(target_height)
+    preferred_acodecs = ('opus', 'vorbis') if prefer_webm else ('mp4a', 'aac')
+
+    chosen_v = best_v_rank = None
+    chosen_webm = best_webm_rank = None
+    chosen_a = best_a_rank = None
+
+    for f in info.get('formats', []):
+        get = f.get
+        vcodec = get('vcodec')
+
+        if vcodec == 'none':
+            acodec = get('acodec')
+            if acodec == 'none':
+                continue
+            # Choose audio: prefer Opus/Vorbis for WebM, AAC/M4A for MP4, else best tbr
+            acodec = acodec or ''
+            rank = (any(c in acodec for c in preferred_acodecs), get('tbr') or 0)
+            if chosen_a is None or rank > best_a_rank:
+                chosen_a, best_a_rank = f, rank
+            continue
+
+        height = get('height')
+        if not height:
+            continue
 
-    def score_video(f):
         # Higher bitrate & newer codecs get higher score at the same height
-        score = 0
-        vcodec = (f.get('vcodec') or '').lower()
-        if 'av01' in vcodec or 'av1' in vcodec:
-            score += 300
-        elif 'vp9' in vcodec or 'vp09' in vcodec:
-            score += 200
-        elif 'avc' in vcodec or 'h264' in vcodec:
-            score += 150
-        score += (f.get('tbr') or 0) / 10.0
-        return score
+        family = (vcodec or '').split('.', 1)[0].lower()
+        score = _VCODEC_SCORES.get(family, 0) + (get('tbr') or 0) / 10.0
+
+        if height == target_height:
+            rank = (2, 0, score)
+        elif height < target_height:
+            # Prefer the closest LOWER resolution to truly respect the user's choice
+            rank = (1, height, score)
+        else:
+            # Only if nothing <= target exists, go to the smallest higher resolution
+            rank = (0, -height, score)
+
+        if chosen_v is None or rank > best_v_rank:
+            chosen_v, best_v_rank = f, rank
+        if prefer_webm and (get('ext') or '').lower() == 'webm':
+            if chosen_webm is None or rank > best_webm_rank:
+                chosen_webm, best_webm_rank = f, rank
 
     # Apply container preference if needed
-    def filter_by_container(vfs):
-        if prefer_webm:
-            webm = [f for f in vfs if (f.get('ext') or '').lower() == 'webm']
-            if webm:
-                return webm
-        return vfs
-
-    video_formats = filter_by_container(video_formats)
-
-    exact = [f for f in video_formats if f.get('height') == target_height]
-    above = [f for f in video_formats if f.get('height') and f['height'] > target_height]
-    below = [f for f in video_formats if f.get('height') and f['height'] < target_height]
-
-    chosen_v = None
-    if exact:
-        # Best score among exact height candidates
-        chosen_v = max(exact, key=score_video)
-    elif below:
-        # Prefer the closest LOWER resolution to truly respect the user's choice
-        max_height = max(f['height'] for f in below)
-        closest_below = [f for f in below if f['height'] == max_height]
-        chosen_v = max(closest_below, key=score_video)
-    elif above:
-        # Only if nothing <= target exists, go to the smallest higher resolution
-        min_height = min(f['height'] for f in above)
-        closest_above = [f for f in above if f['height'] == min_height]
-        chosen_v = max(closest_above, key=score_video)
+    if chosen_webm is not None:
+        chosen_v = chosen_webm
 
     if not chosen_v:
-        logger.warning("Falling back to absolute best available video format.")
-        chosen_v = max(video_formats, key=score_video)
-
-    # Choose audio: prefer Opus/Vorbis for WebM, AAC/M4A for MP4, else best tbr
-    chosen_a = None
-    if audio_formats:
-        if prefer_webm:
-            opus = [a for a in audio_formats if 'opus' in (a.get('acodec') or '') or 'vorbis' in (a.get('acodec') or '')]
-            if opus:
-                chosen_a = max(opus, key=lambda a: (a.get('tbr') or 0))
-        else:
-            aac = [a for a in audio_formats if 'mp4a' in (a.get('acodec') or '') or 'aac' in (a.get('acodec') or '')]
-            if aac:
-                chosen_a = max(aac, key=lambda a: (a.get('tbr') or 0))
-
-        if not chosen_a:
-            chosen_a = max(audio_formats, key=lambda a: (a.get('tbr') or 0))
+        logger.warning("No video formats found for this video.")
+        return None, None
 
     logger.info(
         f"Chosen video format: id={chosen_v.get('format_id')} "
@@ -190,46 +297,274 @@ def _choose_video_and_audio_formats(info, target_height: int, prefer_webm: bool
     return v_id, a_id
 
 
-def get_video_info(url):
+def _extract_info(url, extra_opts=None):
+    """
+    Run a single metadata-only yt-dlp extraction and return the raw info dict.
+    Callers that need both the summary and the formats should share this
+    result instead of extracting the same URL twice.
+    """
+    key = _cache_key(url, extra_opts)
+    info = _cache_get(key)
+    if info is not None:
+        logger.info(f"Using cached video info for {url}")
+        return info
+    if not extra_opts:
+        # Another worker may have extracted this URL already (e.g. for /api/info).
+        raw = _redis_get(_redis_key("raw_info", url))
+        if raw is not None:
+            logger.info(f"Using shared video info for {url}")
+            info = json.loads(raw)
+            _cache_put(key, info)
+            return info
+
     ydl_opts = get_ydl_base_opts()
-    ydl_opts.update({
-        'skip_download': True,
-        'noplaylist': False,  # Enable playlist analysis
-        'extract_flat': True,  # Don't extract full details for every video in playlist yet (too slow)
-    })
-    
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    ydl_opts.update({'skip_download': True})
+    if extra_opts:
+        ydl_opts.update(extra_opts)
+
+    with _pooled_ydl(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    # Only successful extractions get here, failures are never cached.
+    if extra_opts:
+        _cache_put(key, info)
+    else:
+        _remember_full_info(url, info)
+    return info
+
+
+def _remember_full_info(url, info):
+    """Cache a fully extracted info dict for stream_media, locally and in Redis."""
+    _cache_put(_cache_key(url), info)
+    if _get_redis() is not None:
+        # sanitize_info turns the dict into plain JSON types; process_ie_result
+        # accepts it back just like a --load-info-json file.
+        _redis_set(_redis_key("raw_info", url), json.dumps(yt_dlp.YoutubeDL.sanitize_info(info)), CACHE_TTL)
+
+
+@contextlib.contextmanager
+def _pooled_ydl(opts):
+    """
+    Borrow an idle YoutubeDL built with opts, or build a new one. Each
+    instance is used by one thread at a time and goes back to the pool
+    afterwards. Only use this for option sets without per-request state
+    (e.g. no temp-dir outtmpl).
+    """
+    key = repr(sorted(opts.items()))
+    cookie_mtime = _cookie_file_mtime(opts)
+    stale = None
+    with _ydl_pool_lock:
+        entry = _ydl_pool.get(key)
+        if entry is None or entry[0] != cookie_mtime:
+            # New key, or the cookie file was replaced: pooled instances
+            # loaded the old jar once and would keep using it.
+            if entry is not None:
+                stale = entry[1]
+            entry = _ydl_pool[key] = (cookie_mtime, queue.SimpleQueue())
+    idle = entry[1]
+    while stale is not None:
         try:
-            info = ydl.extract_info(url, download=False)
-        except Exception as e:
-            logger.error(f"yt-dlp error: {e}")
-            raise Exception(f"Error fetching video info: {str(e)}")
-
-        if 'entries' in info:
-            # It's a playlist
-            entries = list(info['entries'])
-            return {
-                'type': 'playlist',
-                'title': info.get('title', 'Unknown Playlist'),
-                'count': len(entries),
-                'videos': [
-                    {'url': f"https://www.youtube.com/watch?v={entry['id']}", 'title': entry.get('title', 'Unknown')}
-                    for entry in entries if entry.get('id')
-                ]
-            }
-
-        # It's a single video
-        duration = info.get('duration', 0)
-        # No limitation check
-        
+            _discard_ydl(stale.get_nowait())
+        except queue.Empty:
+            break
+    try:
+        ydl = idle.get_nowait()
+    except queue.Empty:
+        ydl = yt_dlp.YoutubeDL(opts)
+
+    try:
+        yield ydl
+    except Exception:
+        # Don't hand a possibly half-broken instance to the next request.
+        _discard_ydl(ydl)
+        raise
+    with _ydl_pool_lock:
+        current = _ydl_pool.get(key) is entry
+        if current:
+            idle.put(ydl)
+    if not current:
+        _discard_ydl(ydl)
+
+
+def _cookie_file_mtime(opts):
+    cookie_file = opts.get('cookiefile')
+    if not cookie_file:
+        return None
+    try:
+        return os.stat(cookie_file).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _discard_ydl(ydl):
+    """Close a YoutubeDL without writing its cookie jar back."""
+    # close() saves the cookie jar to the cookie file. The file is managed by
+    # the operator (or written once from YT_COOKIES_BASE64): a pooled
+    # instance's jar may predate a replaced file, and any save bumps the
+    # mtime that _pooled_ydl watches, which would empty the pool.
+    ydl.params['cookiefile'] = None
+    ydl.close()
+
+
+@contextlib.contextmanager
+def _single_use_ydl(opts):
+    """A YoutubeDL for one download (per-request outtmpl), closed like _discard_ydl."""
+    ydl = yt_dlp.YoutubeDL(opts)
+    try:
+        yield ydl
+    finally:
+        _discard_ydl(ydl)
+
+
+def _cache_key(url, extra_opts=None):
+    return (url, tuple(sorted((extra_opts or {}).items())))
+
+
+def _cache_get(key):
+    """Return the cached info for key, or None if missing or expired."""
+    with _info_cache_lock:
+        entry = _info_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, info = entry
+        if expires_at < time.monotonic():
+            del _info_cache[key]
+            return None
+        return info
+
+
+def _cache_put(key, info):
+    if CACHE_TTL <= 0 or CACHE_MAX_ENTRIES <= 0:
+        return
+    now = time.monotonic()
+    with _info_cache_lock:
+        _info_cache.pop(key, None)
+        # Dicts keep insertion order and every entry gets the same TTL, so the
+        # first key is both the oldest and the first to expire. Drop expired
+        # entries right away instead of waiting for their key to come back.
+        while _info_cache:
+            oldest = next(iter(_info_cache))
+            if _info_cache[oldest][0] >= now and len(_info_cache) < CACHE_MAX_ENTRIES:
+                break
+            del _info_cache[oldest]
+        _info_cache[key] = (now + CACHE_TTL, info)
+
+
+def _redis_key(prefix, url):
+    return prefix + ":" + hashlib.sha1(url.strip().encode("utf-8")).hexdigest()
+
+
+def _get_redis():
+    """Return a shared Redis client for REDIS_URL, or None if not configured."""
+    global _redis_client
+    if _redis_client is None and REDIS_URL:
+        # Connections are opened lazily (and pooled) by redis-py itself. Short
+        # timeouts so an unreachable Redis degrades to a cache miss (RedisError)
+        # instead of hanging the request until the OS gives up on the socket.
+        _redis_client = redis.Redis.from_url(
+            REDIS_URL, socket_connect_timeout=REDIS_TIMEOUT, socket_timeout=REDIS_TIMEOUT
+        )
+    return _redis_client
+
+
+def _redis_get(key):
+    client = _get_redis()
+    if client is None:
+        return None
+    try:
+        return client.get(key)
+    except redis.RedisError as e:
+        logger.warning("Redis read failed, ignoring cache: %s", e)
+        return None
+
+
+def _redis_set(key, value, ttl):
+    client = _get_redis()
+    if client is None or ttl <= 0:
+        return
+    try:
+        client.setex(key, ttl, value)
+    except redis.RedisError as e:
+        logger.warning("Redis write failed, ignoring cache: %s", e)
+
+
+def _redis_get_hash(key):
+    """Return a Redis hash as {bytes: bytes}, or None if missing."""
+    client = _get_redis()
+    if client is None:
+        return None
+    try:
+        return client.hgetall(key) or None
+    except redis.RedisError as e:
+        logger.warning("Redis read failed, ignoring cache: %s", e)
+        return None
+
+
+def _redis_set_hash(key, mapping, ttl):
+    client = _get_redis()
+    if client is None or ttl <= 0:
+        return
+    try:
+        # One MULTI/EXEC round trip; DEL replaces whatever was stored before.
+        client.pipeline().delete(key).hset(key, mapping=mapping).expire(key, ttl).execute()
+    except redis.RedisError as e:
+        logger.warning("Redis write failed, ignoring cache: %s", e)
+
+
+def summarize_info(info):
+    """Build the public /api/info payload from a raw yt-dlp info dict."""
+    if 'entries' in info:
+        # It's a playlist. Unavailable entries can come back as None.
+        videos = [
+            {'url': _YOUTUBE_WATCH_URL + entry['id'], 'title': entry.get('title', 'Unknown')}
+            for entry in info['entries'] if entry and entry.get('id')
+        ]
         return {
-            'type': 'video',
-            'title': info.get('title', 'Unknown'),
-            'duration': duration,
-            'thumbnail': info.get('thumbnail', ''),
-            'has_subtitles': bool(info.get('subtitles') or info.get('automatic_captions'))
+            'type': 'playlist',
+            'title': info.get('title', 'Unknown Playlist'),
+            'count': len(videos),
+            'videos': videos
         }
 
+    # It's a single video
+    duration = info.get('duration', 0)
+    # No limitation check
+
+    return {
+        'type': 'video',
+        'title': info.get('title', 'Unknown'),
+        'duration': duration,
+        'thumbnail': info.get('thumbnail', ''),
+        'has_subtitles': bool(info.get('subtitles') or info.get('automatic_captions'))
+    }
+
+
+def get_video_info(url):
+    summary_key = _redis_key("info", url)
+    cached = _redis_get(summary_key)
+    if cached is not None:
+        return json.loads(cached)
+
+    try:
+        info = _extract_info(url, {
+            'noplaylist': False,  # Enable playlist analysis
+            'extract_flat': 'in_playlist',  # Don't extract full details for every video in playlist yet (too slow)
+        })
+    except Exception as e:
+        logger.error(f"yt-dlp error: {e}")
+        raise Exception(f"Error fetching video info: {str(e)}")
+
+    if 'entries' not in info:
+        # extract_flat only affects playlist entries, so a single video comes
+        # back fully extracted. Store it where stream_media looks first so a
+        # following /api/download (on any worker) doesn't extract the URL again.
+        _remember_full_info(url, info)
+
+    summary = summarize_info(info)
+    ttl = PLAYLIST_CACHE_TTL if summary['type'] == 'playlist' else INFO_CACHE_TTL
+    _redis_set(summary_key, json.dumps(summary), ttl)
+    return summary
+
 def _build_yt_dlp_options_for_mode(info, quality, mode):
     """
     Build a yt-dlp configuration for the selected mode and quality.
@@ -247,120 +582,253 @@ def _build_yt_dlp_options_for_mode(info, quality, mode):
         'noplaylist': True,
     }
 
-    is_audio = mode.startswith("audio")
-    is_webm = "webm" in mode
-
-    if is_audio:
-        # Audio-only: use best audio and convert to MP3 with requested bitrate.
-        bitrate = "192"
-        if "320" in mode:
-            bitrate = "320"
-        elif "128" in mode:
-            bitrate = "128"
-        elif "64" in mode:
-            bitrate = "64"
-
-        opts.update({
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': bitrate,
-            }],
-            'preferredquality': bitrate,
-        })
-        ext = "mp3"
-        content_type = "audio/mpeg"
+    if mode.startswith("audio"):
+        if "m4a" in mode or "aac" in mode:
+            # Audio-only without re-encoding: YouTube already serves AAC in M4A,
+            # so FFmpegExtractAudio keeps that stream as-is (or only swaps the
+            # container) instead of spending a full MP3 encode on it.
+            ext = "m4a"
+            opts['format'] = 'bestaudio[ext=m4a]/bestaudio/best'
+            postprocessor = {'key': 'FFmpegExtractAudio', 'preferredcodec': 'm4a'}
+        else:
+            # Audio-only: use best audio and convert to MP3 with requested bitrate.
+            ext = "mp3"
+            bitrate = next((b for b in _MP3_BITRATES if b in mode), _DEFAULT_MP3_BITRATE)
+            opts['format'] = 'bestaudio/best'
+            postprocessor = {'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3', 'preferredquality': bitrate}
+        opts['postprocessors'] = [postprocessor]
     else:
         # Video modes – we now select explicit format IDs using the probed
         # metadata so that we are in full control of the chosen resolution.
-        prefer_webm = is_webm
-        v_id, a_id = _choose_video_and_audio_formats(info, q, prefer_webm=prefer_webm)
+        ext = "webm" if "webm" in mode else "mp4"
+        v_id, a_id = _choose_video_and_audio_formats(info, q, prefer_webm=(ext == "webm"))
         if not v_id:
             raise Exception("Unable to choose a suitable video stream for the requested quality.")
 
-        if a_id:
-            fmt = f"{v_id}+{a_id}"
-        else:
-            fmt = v_id
-
-        if is_webm:
-            opts.update({
-                'format': fmt,
-                'merge_output_format': 'webm',
-            })
-            ext = "webm"
-            content_type = "video/webm"
-        else:
-            opts.update({
-                'format': fmt,
-                'merge_output_format': 'mp4',
-            })
-            ext = "mp4"
-            content_type = "video/mp4"
+        opts['format'] = f"{v_id}+{a_id}" if a_id else v_id
+        opts['merge_output_format'] = ext
 
+    content_type = _CONTENT_TYPES[ext]
     return opts, ext, content_type
 
 
+class DownloadFile(io.FileIO):
+    """
+    Read-only handle on a finished download in its temp directory.
+
+    It is a real file object, so the WSGI server's ``wsgi.file_wrapper`` can
+    hand its descriptor to sendfile(2) instead of copying every byte through
+    Python. It is also unbuffered: servers without sendfile get one read(2)
+    per chunk, with no BufferedReader copy in between. Closing it (the server
+    does so once the response is finished or the client goes away) removes
+    the temp directory, or calls on_close instead when the file is shared.
+    """
+
+    def __init__(self, path, on_close=None):
+        self._on_close = None  # nothing to clean up if opening fails
+        self._remaining = None  # bytes left to read, if restricted
+        super().__init__(path, "rb")
+        self.size = os.fstat(self.fileno()).st_size
+        self._on_close = on_close or functools.partial(_remove_tempdir, os.path.dirname(path))
+
+    def restrict(self, start, stop):
+        """
+        Limit the file to bytes [start, stop) for a Range response. sendfile
+        starts at the current offset (and sends Content-Length bytes); read()
+        stops at stop for servers that iterate the file instead.
+        """
+        self.seek(start)
+        self._remaining = stop - start
+
+    def read(self, size=-1):
+        if self._remaining is None:
+            return super().read(size)
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = super().read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            # close() can run more than once (explicitly, then from __del__)
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close()
+
+
+def _remove_tempdir(directory):
+    """Delete a flat download temp directory (yt-dlp writes no subdirectories)."""
+    with _shm_lock:
+        _shm_reserved.pop(directory, None)
+    try:
+        for entry in os.scandir(directory):
+            try:
+                os.unlink(entry.path)
+            except Exception:
+                pass
+        os.rmdir(directory)
+    except Exception:
+        pass
+
+
+def _expected_size(info, format_spec):
+    """
+    Approximate size in bytes of the formats in an explicit "id+id" spec, or
+    None if it is unknown (including selectors like "bestaudio/best").
+    """
+    formats_by_id = {f.get('format_id'): f for f in info.get('formats') or ()}
+    total = 0
+    for format_id in format_spec.split('+'):
+        f = formats_by_id.get(format_id) or {}
+        size = f.get('filesize') or f.get('filesize_approx')
+        if not size:
+            return None
+        total += size
+    return total
+
+
+def _make_download_dir(expected_size):
+    """Temp directory for one download: in SHM_DIR if the download fits there, else on disk."""
+    if SHM_DIR and expected_size:
+        needed = SHM_HEADROOM * expected_size
+        try:
+            with _shm_lock:
+                if shutil.disk_usage(SHM_DIR).free - sum(_shm_reserved.values()) > needed:
+                    tmpdir = tempfile.mkdtemp(prefix="redcast_", dir=SHM_DIR)
+                    _shm_reserved[tmpdir] = needed
+                    return tmpdir
+        except OSError:
+            # No tmpfs at that path (e.g. not on Linux)
+            pass
+    return tempfile.mkdtemp(prefix="redcast_")
+
+
+class _SharedDownload:
+    """One in-flight download and the responses holding on to its file."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.refs = 0
+        self.result = None  # (filepath, filename, content_type)
+        self.error = None
+
+
 def stream_media(url, quality, mode):
     """
-    Download media with yt-dlp into a temporary file, then stream that file
-    back to the client in chunks. This avoids fragile ffmpeg piping and
-    dramatically reduces the risk of 0-byte or corrupted outputs.
+    Download media with yt-dlp into a temporary file and return it as an open
+    DownloadFile for the web layer to send. This avoids fragile ffmpeg piping
+    and dramatically reduces the risk of 0-byte or corrupted outputs.
+    Identical concurrent requests share one download (see _inflight).
     """
     quality = quality or "1080"
+    key = (url.strip(), str(quality), (mode or "video").lower())
 
-    # First, probe video info so we can choose exact formats for the target height.
-    probe_opts = get_ydl_base_opts()
-    probe_opts.update({'skip_download': True})
+    with _inflight_lock:
+        shared = _inflight.get(key)
+        owner = shared is None
+        if owner:
+            shared = _inflight[key] = _SharedDownload()
+        shared.refs += 1
+    release = functools.partial(_release_download, key, shared)
 
-    with yt_dlp.YoutubeDL(probe_opts) as ydl:
+    if owner:
         try:
-            info = ydl.extract_info(url, download=False)
-        except Exception as e:
-            logger.error(f"Failed to probe video info for {url}: {e}")
-            raise Exception(f"Failed to extract video info: {str(e)}")
+            shared.result = _download_media(url, quality, mode)
+        except BaseException as e:
+            # Also for KeyboardInterrupt and friends: a half-set-up entry left
+            # in the map would break every later request for this key.
+            shared.error = e
+            # Let the next request retry instead of joining a failed download
+            with _inflight_lock:
+                if _inflight.get(key) is shared:
+                    del _inflight[key]
+            release()
+            raise
+        finally:
+            shared.done.set()
+    else:
+        logger.info(f"Joining in-flight download for URL={url}, quality={quality}, mode={mode}")
+        if not shared.done.wait(timeout=INFLIGHT_WAIT_TIMEOUT):
+            # gthread doesn't cut long requests off, so the owner may simply
+            # still be busy (e.g. a long 1080p video): download independently
+            # rather than failing a request that would work on its own.
+            release()
+            logger.warning(f"Identical download still running after {INFLIGHT_WAIT_TIMEOUT}s, downloading separately: URL={url}")
+            filepath, filename, content_type = _download_media(url, quality, mode)
+            return (DownloadFile(filepath), filename, content_type)
+        if shared.error is not None:
+            release()
+            # A fresh exception per waiter: re-raising the shared one would
+            # append every waiter's frames to the same __traceback__.
+            if isinstance(shared.error, Exception):
+                raise Exception(str(shared.error)) from shared.error
+            raise Exception("Download failed: the download was interrupted")
+
+    filepath, filename, content_type = shared.result
+    try:
+        return (DownloadFile(filepath, on_close=release), filename, content_type)
+    except BaseException:
+        release()
+        raise
+
+
+def _release_download(key, shared):
+    """Drop one response's hold on a shared download; the last one cleans up."""
+    with _inflight_lock:
+        shared.refs -= 1
+        if shared.refs > 0:
+            return
+        if _inflight.get(key) is shared:
+            del _inflight[key]
+    if shared.result is not None:
+        _remove_tempdir(os.path.dirname(shared.result[0]))
+
+
+def _download_media(url, quality, mode):
+    """Run the actual download; returns (filepath, filename, content_type)."""
+    # Probe video info once so we can choose exact formats for the target height.
+    # The same info dict is handed back to yt-dlp for the download below, so the
+    # extractor (webpage + player JS) only runs a single time per request.
+    try:
+        info = _extract_info(url)
+    except Exception as e:
+        logger.error(f"Failed to probe video info for {url}: {e}")
+        raise Exception(f"Failed to extract video info: {str(e)}")
 
     # Configure yt-dlp based on mode/quality and the probed info
     ydl_opts, ext, content_type = _build_yt_dlp_options_for_mode(info, quality, mode)
 
     # Create a temp directory to hold the downloaded file(s)
-    tmpdir = tempfile.mkdtemp(prefix="redcast_")
+    tmpdir = _make_download_dir(_expected_size(info, ydl_opts['format']))
 
     # Use the original video title as filename; yt-dlp will also sanitize it.
     # We still scope it to the temp directory so multiple downloads don't clash.
-    title = info.get('title') or 'video'
-    # yt-dlp will sanitize invalid characters; we just provide a pattern.
     outtmpl = os.path.join(tmpdir, "%(title)s.%(ext)s")
     ydl_opts['outtmpl'] = outtmpl
 
     logger.info(f"Starting yt-dlp download for URL={url}, quality={quality}, mode={mode}")
 
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
+        with _single_use_ydl(ydl_opts) as ydl:
+            # Re-process the probed info instead of extracting again (same as
+            # yt-dlp's --load-info-json); sanitize_info returns a fresh copy.
+            info = ydl.process_ie_result(ydl.sanitize_info(info, remove_private_keys=True), download=True)
     except Exception as e:
         # Cleanup temp directory on failure
-        try:
-            for f in glob.glob(os.path.join(tmpdir, "*")):
-                os.remove(f)
-            os.rmdir(tmpdir)
-        except Exception:
-            pass
+        _remove_tempdir(tmpdir)
         logger.error(f"yt-dlp download failed: {e}")
         raise Exception(f"Download failed: {str(e)}")
 
     # Locate the actual output file matching our expected extension
-    files = glob.glob(os.path.join(tmpdir, f"*.{ext}"))
+    suffix = f".{ext}"
+    files = [entry.path for entry in os.scandir(tmpdir) if entry.name.endswith(suffix)]
     if not files:
         # Fallback: try to infer from info
         logger.error("No output files found after yt-dlp download.")
-        try:
-            for f in glob.glob(os.path.join(tmpdir, "*")):
-                os.remove(f)
-            os.rmdir(tmpdir)
-        except Exception:
-            pass
+        _remove_tempdir(tmpdir)
         raise Exception("Internal error: no downloaded file found.")
 
     filepath = files[0]
@@ -370,66 +838,62 @@ def stream_media(url, quality, mode):
     # characters in header values, so we aggressively sanitize here while
     # still keeping something readable for the user.
     raw_title = info.get('title') or Path(filepath).stem
-    safe_title = re.sub(r'[^A-Za-z0-9_\-\. ]+', '_', raw_title).strip()
+    safe_title = raw_title.encode('ascii', 'replace').decode('ascii').translate(_FILENAME_TABLE).strip()
     if not safe_title:
         safe_title = "video"
     # Keep filename reasonably short for headers
     safe_title = safe_title[:180]
     filename = f"{safe_title}.{ext}"
 
-    def file_generator(path, directory):
-        """Yield file contents in chunks, then clean up temp files."""
-        try:
-            with open(path, "rb") as f:
-                while True:
-                    chunk = f.read(1024 * 1024)  # 1 MB
-                    if not chunk:
-                        break
-                    yield chunk
-        finally:
-            try:
-                os.remove(path)
-            except Exception:
-                pass
-            try:
-                # Remove any stray files and the temp directory itself
-                for f in glob.glob(os.path.join(directory, "*")):
-                    try:
-                        os.remove(f)
-                    except Exception:
-                        pass
-                os.rmdir(directory)
-            except Exception:
-                pass
+    return (filepath, filename, content_type)
+
+class MemoryFile(io.BytesIO):
+    """In-memory stand-in for DownloadFile, for content served from a cache."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.size = len(data)
 
-    return (file_generator(filepath, tmpdir), filename, content_type)
 
 def download_subtitles(url, lang='en'):
-    import glob
-    import tempfile
-    
-    with tempfile.TemporaryDirectory() as tmpdir:
-        ydl_opts = get_ydl_base_opts()
-        ydl_opts.update({
-            'skip_download': True,
-            'writesubtitles': True,
-            'writeautomaticsub': True,
-            'subtitleslangs': [lang],
-            'subtitlesformat': 'srt',
-            'outtmpl': f'{tmpdir}/%(title)s.%(ext)s',
-        })
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    """
+    Fetch subtitles into a temporary directory and return them as an open
+    DownloadFile (removed once the response is closed) plus the filename.
+    Subtitles already fetched by any worker come back as a MemoryFile.
+    """
+    cache_key = _redis_key(f"srt:{lang}", url)
+    cached = _redis_get_hash(cache_key)
+    if cached is not None:
+        return MemoryFile(cached[b'srt']), cached[b'filename'].decode("utf-8")
+
+    tmpdir = tempfile.mkdtemp(prefix="redcast_")
+
+    ydl_opts = get_ydl_base_opts()
+    ydl_opts.update({
+        'skip_download': True,
+        'writesubtitles': True,
+        'writeautomaticsub': True,
+        'subtitleslangs': [lang],
+        'subtitlesformat': 'srt',
+        'outtmpl': f'{tmpdir}/%(title)s.%(ext)s',
+    })
+
+    try:
+        with _single_use_ydl(ydl_opts) as ydl:
             try:
                 ydl.extract_info(url, download=True)
             except Exception as e:
                 raise Exception(f"Subtitle download failed: {str(e)}")
-                
-            files = glob.glob(f"{tmpdir}/*.srt")
-            if not files:
-                raise Exception("No subtitles found.")
-            
-            with open(files[0], 'rb') as f:
-                content = f.read()
-            
-            return content, os.path.basename(files[0])
+
+        with os.scandir(tmpdir) as entries:
+            srt = next((entry for entry in entries if entry.name.endswith(".srt")), None)
+        if srt is None:
+            raise Exception("No subtitles found.")
+    except Exception:
+        _remove_tempdir(tmpdir)
+        raise
+
+    if _get_redis() is not None:
+        # Stored as raw bytes: SRTs aren't guaranteed to be valid UTF-8
+        _redis_set_hash(cache_key, {'filename': srt.name, 'srt': Path(srt.path).read_bytes()}, SUBTITLE_CACHE_TTL)
+    return DownloadFile(srt.path), srt.name
@@ -2,10 +2,14 @@ import os
 
 # Gunicorn configuration
 bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
-workers = 2  # Adjust based on Railway tier (Free tier is limited)
-threads = 4
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))  # Adjust based on Railway tier (Free tier is limited)
+# Each download holds a thread while yt-dlp fetches it and while it is sent,
+# but mostly waits on sockets and disk (sendfile runs without the GIL).
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
 timeout = 300  # Longer timeout for streaming/downloads
-worker_class = "gthread"
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 600))  # Let running downloads finish on redeploy
+sendfile = True  # Downloads are handed over as real files (see downloader.DownloadFile)
+worker_class = "gthread"  # not gevent: yt-dlp downloads fragments in threads and runs ffmpeg via subprocess
 loglevel = "info"
 accesslog = "-"
 errorlog = "-"
@@ -1,16 +1,53 @@
-from flask import Flask, request, jsonify, Response, stream_with_context
+from flask import Flask, request, jsonify, Response, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from downloader import get_video_info, stream_media, download_subtitles
+from flask_compress import Compress
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.wsgi import wrap_file
+from downloader import get_video_info, stream_media, download_subtitles, CHUNK_SIZE
 from security import setup_security
 import os
+import hashlib
 import logging
 import traceback
+import orjson
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON encoded and decoded with orjson (playlist payloads can get large)."""
+
+    def loads(self, s, **kwargs):
+        # Also used by request.json
+        return orjson.loads(s)
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_SORT_KEYS).decode()
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping the str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE),
+            mimetype=self.mimetype,
+        )
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+
+# Compress JSON (playlist listings) and subtitles. Media downloads are already
+# compressed and keep going out untouched via sendfile.
+app.config.update(
+    COMPRESS_MIMETYPES=["application/json", "text/plain"],
+    COMPRESS_LEVEL=4,
+    COMPRESS_ALGORITHM=["br", "gzip"],
+    COMPRESS_ALGORITHM_STREAMING=["br"],  # flask-compress can't stream gzip
+)
+Compress(app)
 
 # Strict CORS configuration
 FRONTEND_URL = os.getenv("FRONTEND_URL", "*")
@@ -64,16 +101,7 @@ def download():
         return "URL is required", 400
 
     try:
-        generator, filename, content_type = stream_media(url, quality, mode)
-        
-        return Response(
-            stream_with_context(generator),
-            mimetype=content_type,
-            headers={
-                "Content-Disposition": f"attachment; filename=\"{filename}\"",
-                "Access-Control-Expose-Headers": "Content-Disposition"
-            }
-        )
+        file, filename, content_type = stream_media(url, quality, mode)
     except Exception as e:
         error_msg = traceback.format_exc()
         logger.error(f"Download Error: {str(e)}\n{error_msg}")
@@ -83,6 +111,35 @@ def download():
             "traceback": error_msg if os.getenv("DEBUG", "true").lower() == "true" else "Traceback hidden. Set DEBUG=true to see it."
         }), 500
 
+    response = Response(
+        mimetype=content_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=\"{filename}\"",
+            # Resuming cross-origin needs the validators and range headers too
+            "Access-Control-Expose-Headers": "Content-Disposition, ETag, Content-Range, Accept-Ranges"
+        }
+    )
+    response.content_length = file.size
+    # A new download of the same URL, quality and mode yields the same file,
+    # which lets clients resume an interrupted download with If-Range.
+    response.set_etag(hashlib.sha1(f"{url}|{quality}|{mode}|{file.size}".encode("utf-8")).hexdigest())
+    try:
+        response.make_conditional(request, accept_ranges=True, complete_length=file.size)
+    except RequestedRangeNotSatisfiable:
+        file.close()
+        raise
+    if response.status_code == 206:
+        # Position the file itself rather than letting werkzeug read up to
+        # the start of the range, so the range still goes out via sendfile.
+        file.restrict(response.content_range.start, response.content_range.stop)
+
+    # Pass the open file straight to the WSGI server: gunicorn sends it
+    # with sendfile(2), other servers fall back to iterating it in chunks.
+    # Either way the server closes it, which removes the temp files.
+    response.response = wrap_file(request.environ, file, CHUNK_SIZE)
+    response.direct_passthrough = True
+    return response
+
 @app.route("/api/subtitles", methods=["GET"])
 def subtitles():
     """Download subtitles"""
@@ -93,15 +150,20 @@ def subtitles():
         return "URL is required", 400
 
     try:
-        content, filename = download_subtitles(url, lang)
-        return Response(
-            content,
-            mimetype="text/plain",
-            headers={
-                "Content-Disposition": f"attachment; filename=\"{filename}\"",
-                "Content-Security-Policy": "default-src 'self'; script-src 'none'; object-src 'none';"
-            }
-        )
+        file, filename = download_subtitles(url, lang)
+        # send_file hands the file to wsgi.file_wrapper (sendfile under
+        # gunicorn) and RFC 5987-encodes non-ASCII subtitle filenames.
+        # No Range support (and no Accept-Ranges): subtitles are small, and
+        # flask-compress would compress a 206 whose Content-Range counts
+        # uncompressed bytes.
+        response = send_file(file, mimetype="text/plain", as_attachment=True, download_name=filename, conditional=False)
+        # send_file only measures BytesIO (cached subtitles) itself
+        response.content_length = file.size
+        response.headers["Content-Security-Policy"] = "default-src 'self'; script-src 'none'; object-src 'none';"
+        # Compression replaces the file wrapper (which the server would close)
+        # with a generator, so close the file when the response is closed too.
+        response.call_on_close(file.close)
+        return response
     except Exception as e:
         error_msg = traceback.format_exc()
         logger.error(f"Subtitle Error: {str(e)}\n{error_msg}")
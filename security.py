@@ -2,27 +2,33 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import os
 
+# Redis client options for the limiter's storage, passed through to
+# redis.from_url. Bounds the connection pool each worker keeps.
+REDIS_STORAGE_OPTIONS = {"max_connections": 32}
+
+
+def _mk_limiter(app, storage_uri):
+    # fixed-window costs one Lua INCR+EXPIRE round trip per limit; moving-window
+    # would keep a Redis list entry for every counted request
+    return Limiter(
+        get_remote_address,
+        app=app,
+        default_limits=["1000 per hour", "5000 per day"],
+        storage_uri=storage_uri,
+        storage_options=REDIS_STORAGE_OPTIONS if storage_uri.startswith(("redis://", "rediss://")) else {},
+        strategy="fixed-window",
+    )
+
+
 def setup_security(app):
     # Use Redis for rate limiting if available (Railway often provides Redis)
     storage_uri = os.getenv("REDIS_URL", "memory://")
     
     try:
-        limiter = Limiter(
-            get_remote_address,
-            app=app,
-            default_limits=["1000 per hour", "5000 per day"],
-            storage_uri=storage_uri,
-            strategy="fixed-window",
-        )
+        limiter = _mk_limiter(app, storage_uri)
     except Exception as e:
         print(f"Redis connection failed ({e}), falling back to memory storage.")
-        limiter = Limiter(
-            get_remote_address,
-            app=app,
-            default_limits=["1000 per hour", "5000 per day"],
-            storage_uri="memory://",
-            strategy="fixed-window",
-        )
+        limiter = _mk_limiter(app, "memory://")
 
     @app.after_request
     def add_headers(response):